@@ -0,0 +1,60 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+def _parse_log_level(name: str) -> int:
+    """把 LOG_LEVEL 名称（如 DEBUG）转换为日志级别，无法识别时使用 INFO"""
+    level = logging.getLevelName(name.strip().upper())
+    return level if isinstance(level, int) else logging.INFO
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    应用配置
+    启动时从环境变量读取一次，之后只读，请求处理中直接访问属性
+    """
+
+    ollama_url: str
+    twilio_account_sid: Optional[str]
+    twilio_auth_token: Optional[str]
+    twilio_number: Optional[str]
+    max_calls: int = 100
+    max_sms: int = 100
+    redis_url: Optional[str] = None
+    public_base_url: Optional[str] = None
+    validate_signature: bool = True
+    ollama_num_parallel: int = 4
+    ollama_read_timeout: float = 120.0
+    batch_window: float = 0.01
+    max_batch: int = 8
+    cache_size: int = 1024
+    cache_ttl: float = 600
+    log_level: int = logging.INFO
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        从环境变量构建配置
+
+        Returns:
+            Settings: 冻结的配置对象
+        """
+        return cls(
+            ollama_url=os.getenv('OLLAMA_API_URL', 'http://localhost:11434'),
+            twilio_account_sid=os.getenv('TWILIO_ACCOUNT_SID'),
+            twilio_auth_token=os.getenv('TWILIO_AUTH_TOKEN'),
+            twilio_number=os.getenv('TWILIO_PHONE_NUMBER'),
+            max_calls=int(os.getenv('MAX_CALLS_PER_DAY', 100)),
+            max_sms=int(os.getenv('MAX_SMS_PER_DAY', 100)),
+            redis_url=os.getenv('REDIS_URL') or None,
+            public_base_url=os.getenv('PUBLIC_BASE_URL') or None,
+            validate_signature=os.getenv('TWILIO_VALIDATE_SIGNATURE', 'true').lower() != 'false',
+            ollama_num_parallel=int(os.getenv('OLLAMA_NUM_PARALLEL', 4)),
+            ollama_read_timeout=float(os.getenv('OLLAMA_READ_TIMEOUT', 120)),
+            batch_window=float(os.getenv('OLLAMA_BATCH_WINDOW_MS', 10)) / 1000,
+            max_batch=int(os.getenv('OLLAMA_MAX_BATCH', 8)),
+            cache_size=int(os.getenv('RESPONSE_CACHE_SIZE', 1024)),
+            cache_ttl=float(os.getenv('RESPONSE_CACHE_TTL', 600)),
+            log_level=_parse_log_level(os.getenv('LOG_LEVEL', 'INFO'))
+        )
@@ -1,159 +1,468 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks, Depends
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import FormData
 from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from twilio.base.exceptions import TwilioRestException
 from twilio.request_validator import RequestValidator
 import httpx
+import multiprocessing
+import orjson
 import os
+import re
+import time
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import AsyncIterator
+from urllib.parse import quote
+from xml.sax.saxutils import escape as xml_escape
 from dotenv import load_dotenv
+from config.settings import Settings
+from utils.batcher import PromptBatcher
+from utils.pending_replies import PendingReplies, RedisPendingReplies
 from utils.rate_limiter import RateLimiter
-from utils.logger import setup_logger
+from utils.response_cache import ResponseCache
+from utils.redis_rate_limiter import RedisRateLimiter
+from redis.asyncio import Redis
+from utils.logger import setup_logger, shutdown_logger
 
 # Load environment variables
 load_dotenv()
 
 # Set up logging
-logger = setup_logger()
+# uvicorn --workers runs the app in spawned child processes (and only reads, never sets,
+# WEB_CONCURRENCY), so any child process writes its own files so rotation doesn't collide
+LOG_PER_PROCESS = (
+    multiprocessing.parent_process() is not None
+    or int(os.getenv('WEB_CONCURRENCY', 1)) > 1
+)
+logger = setup_logger(per_process=LOG_PER_PROCESS)
+
+async def _mark_ollama_request(request: httpx.Request) -> None:
+    request.extensions['started_at'] = time.perf_counter()
+
+async def _log_ollama_response(response: httpx.Response) -> None:
+    # Includes time spent waiting for a pooled connection, useful when tuning OLLAMA_NUM_PARALLEL
+    started_at = response.request.extensions.get('started_at')
+    if started_at is not None:
+        logger.debug(
+            f"Ollama {response.request.url.path} -> {response.status_code} "
+            f"headers after {time.perf_counter() - started_at:.3f}s"
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared clients and rate limiters once per worker"""
+    # Read the environment once; handlers use the frozen settings object
+    settings = app.state.settings = Settings.from_env()
+
+    # Applies LOG_LEVEL; after a previous shutdown stopped the log listener,
+    # this also rebuilds it so records are written again
+    setup_logger(log_level=settings.log_level, per_process=LOG_PER_PROCESS)
+    logger.info("Starting Twilio Voice Chatbot")
+
+    # Twilio webhook signature validation
+    app.state.validator = RequestValidator(settings.twilio_auth_token)
+
+    # Twilio client configuration
+    try:
+        app.state.twilio = Client(
+            settings.twilio_account_sid,
+            settings.twilio_auth_token
+        )
+    except Exception as e:
+        logger.error(f"Twilio initialization error: {e}")
+        raise
+
+    # Initialize rate limiter
+    # With REDIS_URL set, limits are shared across all workers; otherwise each worker counts on its own
+    app.state.redis = None
+    if settings.redis_url:
+        app.state.redis = Redis.from_url(settings.redis_url)
+        app.state.voice_limiter = RedisRateLimiter(
+            app.state.redis, settings.max_calls, prefix="rl:voice"
+        )
+        app.state.sms_limiter = RedisRateLimiter(
+            app.state.redis, settings.max_sms, prefix="rl:sms"
+        )
+        await app.state.voice_limiter.load()
+        await app.state.sms_limiter.load()
+    else:
+        app.state.voice_limiter = RateLimiter(settings.max_calls)
+        app.state.sms_limiter = RateLimiter(settings.max_sms)
+
+    # Shared HTTP client so connections to Ollama are kept alive and reused.
+    # Ollama is a single backend with long generations, so size the pool to its
+    # parallel slots and keep those connections open rather than recycling them.
+    app.state.http = httpx.AsyncClient(
+        base_url=settings.ollama_url,
+        timeout=httpx.Timeout(settings.ollama_read_timeout, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=settings.ollama_num_parallel,
+            max_keepalive_connections=settings.ollama_num_parallel,
+            keepalive_expiry=300
+        ),
+        event_hooks={
+            'request': [_mark_ollama_request],
+            'response': [_log_ollama_response]
+        }
+    )
+
+    # Coalesce prompts arriving within a short window into one concurrent batch
+    app.state.batcher = PromptBatcher(
+        app.state.http,
+        batch_window=settings.batch_window,
+        max_batch=settings.max_batch
+    )
+    app.state.batcher.start()
+
+    # Short-lived cache for repeated prompts such as greetings
+    app.state.response_cache = ResponseCache(
+        maxsize=settings.cache_size,
+        ttl=settings.cache_ttl
+    )
+
+    # Voice replies generated ahead of the /process-speech-result redirect
+    # With Redis the reply is relayed through it, so the redirect may land on any worker
+    if app.state.redis is not None:
+        app.state.pending_replies = RedisPendingReplies(
+            app.state.redis,
+            read_timeout=settings.ollama_read_timeout
+        )
+    else:
+        app.state.pending_replies = PendingReplies()
+
+    yield
+
+    logger.info("Shutting down Twilio Voice Chatbot")
+    await app.state.pending_replies.stop()
+    await app.state.batcher.stop()
+    await app.state.http.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+    shutdown_logger()
 
 # Initialize FastAPI application
-app = FastAPI(title="Twilio Voice Chatbot")
+app = FastAPI(title="Twilio Voice Chatbot", lifespan=lifespan)
+
+def _build_welcome_twiml() -> str:
+    response = VoiceResponse()
+    gather = Gather(
+        input='speech',
+        action='/process-speech',
+        timeout=3,
+        language='en',
+        hints=['Hello', 'Help', 'Goodbye']
+    )
+    gather.say("Welcome to the AI Assistant. How can I help you?", language="en")
+    response.append(gather)
+
+    # Redirect to start if the user doesn't speak
+    response.redirect('/voice')
+    return str(response)
+
+def _build_limit_twiml() -> str:
+    response = VoiceResponse()
+    response.say("Sorry, you have reached the call limit for today.", language="en")
+    response.hangup()
+    return str(response)
+
+def _build_no_speech_twiml() -> str:
+    response = VoiceResponse()
+    response.say("Sorry, I didn't hear that. Please say it again.", language="en")
+    response.redirect('/voice')
+    return str(response)
 
-# Twilio client configuration
-try:
-    twilio_client = Client(
-        os.getenv('TWILIO_ACCOUNT_SID'),
-        os.getenv('TWILIO_AUTH_TOKEN')
+# Placeholder swapped for the (URL- and XML-escaped) CallSid in the cached "thinking" template
+CALL_SID_PLACEHOLDER = "__CALL_SID__"
+
+def _build_thinking_twiml() -> str:
+    response = VoiceResponse()
+    response.say("One moment.", language="en")
+    # Twilio fetches the real answer from here while the reply is already being generated
+    response.redirect(f'/process-speech-result?sid={CALL_SID_PLACEHOLDER}')
+    return str(response)
+
+# Placeholder swapped for the (escaped) LLM text in the cached reply template
+REPLY_PLACEHOLDER = "__LLM_RESPONSE__"
+
+def _build_reply_twiml() -> str:
+    response = VoiceResponse()
+    response.say(REPLY_PLACEHOLDER, language="en")
+
+    # Continue conversation
+    gather = Gather(
+        input='speech',
+        action='/process-speech',
+        timeout=3,
+        language='en'
     )
-    twilio_number = os.getenv('TWILIO_PHONE_NUMBER')
-except Exception as e:
-    logger.error(f"Twilio initialization error: {e}")
-    raise
+    gather.say("Do you have any other questions?", language="en")
+    response.append(gather)
+    return str(response)
+
+# The TwiML documents never change, so serialize them once instead of per request
+WELCOME_TWIML = _build_welcome_twiml()
+LIMIT_TWIML = _build_limit_twiml()
+NO_SPEECH_TWIML = _build_no_speech_twiml()
+REPLY_TWIML_TEMPLATE = _build_reply_twiml()
+THINKING_TWIML_TEMPLATE = _build_thinking_twiml()
 
-# Initialize rate limiter
-voice_limiter = RateLimiter(int(os.getenv('MAX_CALLS_PER_DAY', 100)))
-sms_limiter = RateLimiter(int(os.getenv('MAX_SMS_PER_DAY', 100)))
+def twiml_response(content: str) -> Response:
+    """Return TwiML as-is with the XML content type Twilio expects"""
+    return Response(content=content, media_type="application/xml")
 
-async def process_with_ollama(user_input: str) -> str:
+def render_reply_twiml(text: str) -> str:
+    """Fill the cached reply template with the LLM response"""
+    return REPLY_TWIML_TEMPLATE.replace(REPLY_PLACEHOLDER, xml_escape(text))
+
+def render_thinking_twiml(call_sid: str) -> str:
+    """Fill the cached "thinking" template with the call's result URL"""
+    return THINKING_TWIML_TEMPLATE.replace(CALL_SID_PLACEHOLDER, xml_escape(quote(call_sid, safe='')))
+
+# Split the cached template so sentences can be written as separate <Say> elements
+REPLY_TWIML_HEAD, REPLY_TWIML_TAIL = REPLY_TWIML_TEMPLATE.split(REPLY_PLACEHOLDER)
+SAY_OPEN = REPLY_TWIML_HEAD[REPLY_TWIML_HEAD.rindex('<Say'):]
+SAY_CLOSE = REPLY_TWIML_TAIL[:REPLY_TWIML_TAIL.index('>') + 1]
+
+async def render_reply_twiml_stream(sentences: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Write the reply template incrementally, one <Say> per sentence"""
+    first = True
+    async for sentence in sentences:
+        if first:
+            yield REPLY_TWIML_HEAD + xml_escape(sentence)
+            first = False
+        else:
+            yield SAY_CLOSE + SAY_OPEN + xml_escape(sentence)
+    if first:
+        yield REPLY_TWIML_HEAD
+    yield REPLY_TWIML_TAIL
+
+async def process_with_ollama(batcher: PromptBatcher, cache: ResponseCache, user_input: str) -> str:
     """Process user input with Ollama"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{os.getenv('OLLAMA_API_URL')}/generate",
-                json={"prompt": user_input},
-                timeout=30.0
-            )
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('response', 'Sorry, I’m unable to understand your input right now.')
-            else:
+    async def generate() -> str:
+        response = await batcher.submit(user_input)
+        response.raise_for_status()
+        result = orjson.loads(response.content)
+        return result['response']
+
+    try:
+        # Repeated prompts are served from the cache; failures are never cached
+        return await cache.get_or_compute(user_input, generate)
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Ollama API error: {e.response.status_code}")
+        return "The system is temporarily unable to process your request, please try again later."
+    except KeyError:
+        return 'Sorry, I’m unable to understand your input right now.'
+    except Exception as e:
+        logger.error(f"Error processing with Ollama: {e}")
+        return "Sorry, there was an error processing your request."
+
+# A sentence ends at ., ! or ? followed by whitespace
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+async def stream_from_ollama(
+    client: httpx.AsyncClient,
+    cache: ResponseCache,
+    user_input: str
+) -> AsyncIterator[str]:
+    """Stream user input through Ollama and yield the reply sentence by sentence"""
+    # Cached replies, and identical prompts already being generated, are replayed
+    # instead of hitting Ollama; followers get the reply once the leader finishes
+    try:
+        cached = await cache.acquire(user_input)
+    except Exception as e:
+        logger.error(f"Error streaming from Ollama: {e}")
+        yield "Sorry, there was an error processing your request."
+        return
+
+    if cached is not None:
+        for sentence in SENTENCE_END.split(cached.strip()):
+            yield sentence
+        return
+
+    buffer = ""
+    parts = []
+    produced = False
+    # Error handed to followers if this stream fails; None makes them retry themselves
+    error = None
+    settled = False
+    try:
+        async with client.stream(
+            "POST",
+            "/generate",
+            json={"prompt": user_input, "stream": True}
+        ) as response:
+            if response.status_code != 200:
                 logger.error(f"Ollama API error: {response.status_code}")
-                return "The system is temporarily unable to process your request, please try again later."
-        except Exception as e:
-            logger.error(f"Error processing with Ollama: {e}")
-            return "Sorry, there was an error processing your request."
+                error = RuntimeError(f"Ollama API error: {response.status_code}")
+                yield "The system is temporarily unable to process your request, please try again later."
+                return
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                text = chunk.get('response', '')
+                parts.append(text)
+                buffer += text
+
+                *sentences, buffer = SENTENCE_END.split(buffer)
+                for sentence in sentences:
+                    produced = True
+                    yield sentence
+
+                if chunk.get('done'):
+                    break
+
+        if buffer.strip():
+            produced = True
+            yield buffer.strip()
+        elif not produced:
+            error = ValueError("Ollama returned an empty reply")
+            yield 'Sorry, I’m unable to understand your input right now.'
+
+        if produced:
+            cache.resolve(user_input, "".join(parts))
+            settled = True
+    except Exception as e:
+        logger.error(f"Error streaming from Ollama: {e}")
+        error = e
+        if not produced:
+            yield "Sorry, there was an error processing your request."
+    finally:
+        if not settled:
+            cache.abandon(user_input, error)
+
+async def get_form(request: Request) -> FormData:
+    """Parse the webhook body once and cache it on request.state.form"""
+    form = getattr(request.state, 'form', None)
+    if form is None:
+        form = await request.form()
+        request.state.form = form
+    return form
+
+async def verify_twilio(request: Request) -> None:
+    """Reject requests without a valid Twilio signature before any handler work runs"""
+    # Parse the body once; handlers reuse the same form via get_form
+    form = await get_form(request)
+
+    settings = request.app.state.settings
+    if not settings.validate_signature:
+        return
+
+    signature = request.headers.get('X-Twilio-Signature', '')
+    url = str(request.url)
+    # Twilio signs the public URL it calls (e.g. the ngrok URL), not the local one
+    if settings.public_base_url:
+        url = settings.public_base_url.rstrip('/') + request.url.path
+        if request.url.query:
+            url += f"?{request.url.query}"
+
+    if not signature or not request.app.state.validator.validate(url, dict(form), signature):
+        logger.warning(f"Rejected request with invalid Twilio signature: {request.url.path}")
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
 
-@app.post("/voice")
+def send_sms_reply(twilio_client: Client, body: str, to: str, from_: str) -> None:
+    """Send an SMS reply; runs in the threadpool so the blocking Twilio call stays off the event loop"""
+    try:
+        twilio_client.messages.create(body=body, to=to, from_=from_)
+    except TwilioRestException as e:
+        logger.error(f"Twilio API error sending SMS to {to}: {e}")
+    except Exception as e:
+        logger.error(f"Error sending SMS to {to}: {e}")
+
+@app.post("/voice", dependencies=[Depends(verify_twilio)])
 async def handle_incoming_call(request: Request):
     """Handle incoming call"""
     try:
-        form_data = await request.form()
+        form_data = await get_form(request)
         from_number = form_data.get('From')
 
         # Check rate limit
-        if not voice_limiter.can_proceed(from_number):
-            response = VoiceResponse()
-            response.say("Sorry, you have reached the call limit for today.", language="en")
-            response.hangup()
-            return str(response)
-
-        response = VoiceResponse()
-        gather = Gather(
-            input='speech',
-            action='/process-speech',
-            timeout=3,
-            language='en',
-            hints=['Hello', 'Help', 'Goodbye']
-        )
-        gather.say("Welcome to the AI Assistant. How can I help you?", language="en")
-        response.append(gather)
+        if not await request.app.state.voice_limiter.can_proceed(from_number):
+            return twiml_response(LIMIT_TWIML)
 
-        # Redirect to start if the user doesn't speak
-        response.redirect('/voice')
-        
-        return str(response)
+        return twiml_response(WELCOME_TWIML)
     except Exception as e:
         logger.error(f"Error in voice handler: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/process-speech")
+@app.post("/process-speech", dependencies=[Depends(verify_twilio)])
 async def process_speech(request: Request):
     """Process speech input"""
     try:
-        form_data = await request.form()
+        form_data = await get_form(request)
         user_input = form_data.get('SpeechResult', '')
         
         if not user_input:
-            response = VoiceResponse()
-            response.say("Sorry, I didn't hear that. Please say it again.", language="en")
-            response.redirect('/voice')
-            return str(response)
+            return twiml_response(NO_SPEECH_TWIML)
 
-        # Process user input
-        llm_response = await process_with_ollama(user_input)
-        
-        response = VoiceResponse()
-        response.say(llm_response, language="en")
-
-        # Continue conversation
-        gather = Gather(
-            input='speech',
-            action='/process-speech',
-            timeout=3,
-            language='en'
+        sentences = stream_from_ollama(request.app.state.http, request.app.state.response_cache, user_input)
+
+        # Start generating now and answer with a short filler; Twilio then
+        # redirects to /process-speech-result, which reads the reply as it streams
+        call_sid = form_data.get('CallSid')
+        if call_sid:
+            request.app.state.pending_replies.start(call_sid, sentences)
+            return twiml_response(render_thinking_twiml(call_sid))
+
+        # Stream the reply so the TwiML is written as sentences arrive from Ollama
+        return StreamingResponse(
+            render_reply_twiml_stream(sentences),
+            media_type="application/xml"
         )
-        gather.say("Do you have any other questions?", language="en")
-        response.append(gather)
-        
-        return str(response)
     except Exception as e:
         logger.error(f"Error in speech processor: {e}")
         raise HTTPException(status_code=500, detail="Speech processing error")
 
-@app.post("/sms")
-async def handle_sms(request: Request):
+@app.post("/process-speech-result", dependencies=[Depends(verify_twilio)])
+async def process_speech_result(request: Request, sid: str):
+    """Return the reply started by /process-speech"""
+    try:
+        sentences = await request.app.state.pending_replies.take(sid)
+        if sentences is None:
+            logger.warning(f"No pending reply for call: {sid}")
+            return twiml_response(render_reply_twiml("Sorry, there was an error processing your request."))
+
+        return StreamingResponse(
+            render_reply_twiml_stream(sentences),
+            media_type="application/xml"
+        )
+    except Exception as e:
+        logger.error(f"Error in speech result handler: {e}")
+        raise HTTPException(status_code=500, detail="Speech processing error")
+
+@app.post("/sms", dependencies=[Depends(verify_twilio)])
+async def handle_sms(request: Request, background_tasks: BackgroundTasks):
     """Handle SMS"""
     try:
-        form_data = await request.form()
+        form_data = await get_form(request)
         message_body = form_data.get('Body', '')
         from_number = form_data.get('From', '')
 
         # Check rate limit
-        if not sms_limiter.can_proceed(from_number):
+        if not await request.app.state.sms_limiter.can_proceed(from_number):
             return "Sorry, you have reached the SMS limit for today."
 
         # Process message
-        response_text = await process_with_ollama(message_body)
+        response_text = await process_with_ollama(
+            request.app.state.batcher,
+            request.app.state.response_cache,
+            message_body
+        )
         
-        # Send reply
-        twilio_client.messages.create(
-            body=response_text,
-            to=from_number,
-            from_=twilio_number
+        # Send reply after the webhook has been answered
+        background_tasks.add_task(
+            send_sms_reply,
+            request.app.state.twilio,
+            response_text,
+            from_number,
+            request.app.state.settings.twilio_number
         )
         
         return "Message processed"
     except Exception as e:
         logger.error(f"Error in SMS handler: {e}")
         raise HTTPException(status_code=500, detail="SMS processing error")
-
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting Twilio Voice Chatbot")
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("Shutting down Twilio Voice Chatbot")
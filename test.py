@@ -1,29 +1,51 @@
-import requests
+import asyncio
+import time
 
-def send_sms_test():
+import httpx
+
+# 并发请求数量
+CONCURRENCY = 10
+
+async def send_sms_test(concurrency: int = CONCURRENCY):
     # 设置请求的 URL，替换为您的 ngrok URL
-    url = "https://5e6f-50-231-83-246.ngrok-free.app/sms/reply"
-    
-    # 设置请求的数据
-    data = {
-        "Body": "Hello",            # 短信内容
-        "From": "+15146133398",     # 替换为已验证的发送号码
-        "To": "+15712371754"        # 您的 Twilio 接收号码
-    }
-    
-    try:
-        # 发送 POST 请求
-        response = requests.post(url, data=data)
-        
-        # 输出响应
-        if response.status_code == 200:
-            print("SMS Test Sent Successfully.")
-            print("Response:", response.text)
+    # 注意：服务端需设置 TWILIO_VALIDATE_SIGNATURE=false，否则未签名的请求会返回 403
+    url = "https://5e6f-50-231-83-246.ngrok-free.app/sms"
+
+    # 设置请求的数据；每个请求使用不同的内容和号码，
+    # 避免被回复缓存合并或触发同一号码的速率限制
+    def make_data(i: int) -> dict:
+        return {
+            "Body": f"Hello {i}",                 # 短信内容
+            # 试用账户只能回复已验证号码，其余号码的回复短信会发送失败（仅记录在服务端日志中），
+            # 但不影响对服务端处理能力的测试
+            "From": f"+1514613{3398 + i:04d}",
+            "To": "+15712371754"                  # 您的 Twilio 接收号码
+        }
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        # 同时发送多个 POST 请求，测试服务端的并发处理能力
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *[client.post(url, data=make_data(i)) for i in range(concurrency)],
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+
+    # 输出响应
+    succeeded = 0
+    for i, response in enumerate(responses, 1):
+        if isinstance(response, httpx.HTTPError):
+            print(f"[{i}] An error occurred: {response}")
+        elif isinstance(response, BaseException):
+            raise response
+        elif response.status_code == 200 and "Message processed" in response.text:
+            succeeded += 1
+            print(f"[{i}] SMS Test Sent Successfully. Response: {response.text}")
         else:
-            print(f"Failed to send SMS. Status Code: {response.status_code}")
-            print("Response:", response.text)
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
+            print(f"[{i}] Failed to send SMS. Status Code: {response.status_code}")
+            print(f"[{i}] Response: {response.text}")
+
+    print(f"{succeeded}/{concurrency} succeeded in {elapsed:.2f}s")
 
 # 执行测试
-send_sms_test()
+asyncio.run(send_sms_test())
@@ -0,0 +1,131 @@
+import asyncio
+from typing import List, Optional, Set, Tuple
+
+import httpx
+
+from utils.logger import get_logger
+
+class PromptBatcher:
+    """
+    Ollama 请求合并器
+    在很短的时间窗口内收集多个提示词，一次性并发发送给 Ollama，
+    再把结果分发给各自等待的协程
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        batch_window: float = 0.01,
+        max_batch: int = 8,
+        endpoint: str = "/generate"
+    ):
+        """
+        初始化请求合并器
+
+        Args:
+            client (httpx.AsyncClient): 共享的 HTTP 客户端
+            batch_window (float): 合并窗口（秒）
+            max_batch (int): 每批最多包含的提示词数量
+            endpoint (str): Ollama 生成接口路径
+        """
+        self.client = client
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.endpoint = endpoint
+        self.queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self.logger = get_logger('batcher')
+
+    def start(self) -> None:
+        """启动后台合并任务"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台合并任务，并取消尚未处理的请求"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, prompt: str) -> httpx.Response:
+        """
+        提交一个提示词并等待 Ollama 的响应
+
+        Args:
+            prompt (str): 用户输入
+
+        Returns:
+            httpx.Response: Ollama 返回的原始响应
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((prompt, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """等待第一个请求，然后在合并窗口内尽量收集更多请求"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """并发发送一批请求，并把结果交给对应的 Future"""
+        self.logger.debug(f"Dispatching Ollama batch of {len(batch)} prompts")
+        try:
+            results = await asyncio.gather(
+                *[
+                    self.client.post(self.endpoint, json={"prompt": prompt, "stream": False})
+                    for prompt, _ in batch
+                ],
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            raise
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self) -> None:
+        """后台循环：收集一批请求后交给独立任务发送，不阻塞下一批的收集"""
+        while True:
+            batch = await self._collect()
+            # 调用方可能已经放弃等待，跳过这些请求
+            batch = [(prompt, future) for prompt, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
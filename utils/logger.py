@@ -1,15 +1,21 @@
 import logging
 import os
+import queue
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, Tuple
+
+# 每个日志记录器对应的后台写入线程及其队列处理器
+_listeners: Dict[str, Tuple[QueueListener, QueueHandler]] = {}
 
 def setup_logger(
     name: str = "twilio_bot",
     log_level: int = logging.INFO,
     log_dir: str = "logs",
     max_size: int = 5 * 1024 * 1024,  # 5MB
-    backup_count: int = 5
+    backup_count: int = 5,
+    per_process: bool = False
 ) -> logging.Logger:
     """
     设置应用程序日志记录器
@@ -20,6 +26,7 @@ def setup_logger(
         log_dir (str): 日志文件目录
         max_size (int): 单个日志文件最大大小（字节）
         backup_count (int): 保留的日志文件数量
+        per_process (bool): 是否在文件名中加入进程号，多 worker 部署时避免多个进程轮转同一文件
         
     Returns:
         logging.Logger: 配置好的日志记录器
@@ -46,29 +53,42 @@ def setup_logger(
         # 控制台处理器
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
         
         # 文件处理器
         today = datetime.now().strftime('%Y-%m-%d')
+        suffix = f"{today}_{os.getpid()}" if per_process else today
         file_handler = RotatingFileHandler(
-            filename=log_path / f"{name}_{today}.log",
+            filename=log_path / f"{name}_{suffix}.log",
             maxBytes=max_size,
             backupCount=backup_count,
             encoding='utf-8'
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
         
         # 错误日志单独记录
         error_handler = RotatingFileHandler(
-            filename=log_path / f"{name}_error_{today}.log",
+            filename=log_path / f"{name}_error_{suffix}.log",
             maxBytes=max_size,
             backupCount=backup_count,
             encoding='utf-8'
         )
         error_handler.setFormatter(formatter)
         error_handler.setLevel(logging.ERROR)
-        logger.addHandler(error_handler)
+        
+        # 调用线程只把记录放入队列，格式化和磁盘写入由后台线程完成，
+        # 避免文件 I/O（尤其是轮转时）阻塞事件循环
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        queue_handler = QueueHandler(log_queue)
+        logger.addHandler(queue_handler)
+        listener = QueueListener(
+            log_queue,
+            console_handler,
+            file_handler,
+            error_handler,
+            respect_handler_level=True
+        )
+        listener.start()
+        _listeners[name] = (listener, queue_handler)
         
         logger.info("Logger initialized successfully")
         return logger
@@ -100,4 +120,22 @@ def get_logger(name: str = None) -> logging.Logger:
     """
     if name is None:
         return logging.getLogger('twilio_bot')
-    return logging.getLogger(f'twilio_bot.{name}')
\ No newline at end of file
+    return logging.getLogger(f'twilio_bot.{name}')
+
+def shutdown_logger(name: str = "twilio_bot") -> None:
+    """
+    停止日志后台线程，写出队列中剩余的日志，并移除队列处理器，
+    这样之后再次调用 setup_logger 会重新创建处理器和后台线程
+    
+    Args:
+        name (str): 日志记录器名称
+    """
+    entry = _listeners.pop(name, None)
+    if entry is None:
+        return
+        
+    listener, queue_handler = entry
+    listener.stop()
+    logging.getLogger(name).removeHandler(queue_handler)
+    for handler in listener.handlers:
+        handler.close()
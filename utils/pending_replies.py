@@ -0,0 +1,224 @@
+import asyncio
+import uuid
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from redis.asyncio import Redis
+
+from utils.logger import get_logger
+
+class PendingReplies:
+    """
+    进行中的语音回复
+    在返回"请稍候"的 TwiML 之前就开始生成回复，按 CallSid 保存，
+    之后由结果接口取出并按句子读取。
+    记录只保存在当前进程内，仅适用于单 worker 部署
+    """
+
+    def __init__(self, expire_after: float = 60):
+        """
+        初始化回复表
+
+        Args:
+            expire_after (float): 生成结束后多久仍未被取走就丢弃（秒），例如来电方已挂断
+        """
+        self.expire_after = expire_after
+        self.replies: Dict[str, Tuple[asyncio.Task, asyncio.Queue]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.logger = get_logger('pending_replies')
+
+    def start(self, call_sid: str, sentences: AsyncIterator[str]) -> None:
+        """
+        在后台开始消费回复句子
+
+        Args:
+            call_sid (str): 通话 ID
+            sentences (AsyncIterator[str]): 回复句子的异步迭代器
+        """
+        # 同一通话的旧回复已经无人读取，取消它以释放 Ollama 的并发槽位
+        previous = self.replies.pop(call_sid, None)
+        if previous is not None:
+            previous[0].cancel()
+
+        queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        task = asyncio.create_task(self._drain(sentences, queue))
+        entry = (task, queue)
+        self.replies[call_sid] = entry
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._schedule_expiry(call_sid, entry))
+
+    async def _drain(self, sentences: AsyncIterator[str], queue: asyncio.Queue) -> None:
+        """把句子逐个放入队列，结束时放入 None 作为结束标记"""
+        try:
+            async for sentence in sentences:
+                await queue.put(sentence)
+        except Exception as e:
+            self.logger.error(f"Error generating pending reply: {e}")
+        finally:
+            await queue.put(None)
+
+    def _schedule_expiry(self, call_sid: str, entry: Tuple[asyncio.Task, asyncio.Queue]) -> None:
+        """生成结束后一段时间仍未取走则删除，只删除同一条记录，不影响同一通话的新回复"""
+        def expire() -> None:
+            if self.replies.get(call_sid) is entry:
+                del self.replies[call_sid]
+                self.logger.debug(f"Discarded unclaimed reply for call: {call_sid}")
+
+        asyncio.get_running_loop().call_later(self.expire_after, expire)
+
+    async def take(self, call_sid: str) -> Optional[AsyncIterator[str]]:
+        """
+        取出指定通话的回复
+
+        Args:
+            call_sid (str): 通话 ID
+
+        Returns:
+            Optional[AsyncIterator[str]]: 回复句子的异步迭代器，没有记录时返回None
+        """
+        entry = self.replies.pop(call_sid, None)
+        if entry is None:
+            return None
+        return self._iterate(entry[1])
+
+    @staticmethod
+    async def _iterate(queue: asyncio.Queue) -> AsyncIterator[str]:
+        while True:
+            sentence = await queue.get()
+            if sentence is None:
+                return
+            yield sentence
+
+    async def stop(self) -> None:
+        """取消所有进行中的回复"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.replies.clear()
+
+# 回复结束标记，写在 Redis 列表末尾
+_END = "\x00"
+
+class RedisPendingReplies:
+    """
+    基于 Redis 的进行中语音回复
+    生成回复的 worker 把句子逐个写入 Redis 列表，结果接口由任意 worker 读取，
+    多 worker 部署时 Twilio 的跳转请求落到哪个 worker 都能拿到同一份回复
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        expire_after: float = 60,
+        read_timeout: float = 120,
+        prefix: str = "reply"
+    ):
+        """
+        初始化回复表
+
+        Args:
+            redis (Redis): 共享的 Redis 异步客户端
+            expire_after (float): 最后一次写入后多久仍未被读取就丢弃（秒）
+            read_timeout (float): 读取时等待下一句的最长时间（秒）
+            prefix (str): Redis 键前缀
+        """
+        self.redis = redis
+        self.expire_after = expire_after
+        self.read_timeout = read_timeout
+        self.prefix = prefix
+        self.local: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.logger = get_logger('pending_replies')
+
+    def _current_key(self, call_sid: str) -> str:
+        """该通话当前回复的标识"""
+        return f"{self.prefix}:{call_sid}"
+
+    def _list_key(self, call_sid: str, token: str) -> str:
+        """某一次回复的句子列表"""
+        return f"{self.prefix}:{call_sid}:{token}"
+
+    def start(self, call_sid: str, sentences: AsyncIterator[str]) -> None:
+        """
+        在后台开始生成回复并写入 Redis
+
+        Args:
+            call_sid (str): 通话 ID
+            sentences (AsyncIterator[str]): 回复句子的异步迭代器
+        """
+        # 本进程内同一通话的旧回复已经无人读取，直接取消
+        previous = self.local.pop(call_sid, None)
+        if previous is not None:
+            previous.cancel()
+
+        token = uuid.uuid4().hex
+        task = asyncio.create_task(self._produce(call_sid, token, sentences))
+        self.local[call_sid] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(
+            lambda t: self.local.pop(call_sid, None) if self.local.get(call_sid) is t else None
+        )
+
+    def _ttl(self) -> int:
+        return int(self.expire_after + self.read_timeout)
+
+    async def _produce(self, call_sid: str, token: str, sentences: AsyncIterator[str]) -> None:
+        """把句子写入 Redis 列表；发现被同一通话的新回复取代（可能在别的 worker）时停止生成"""
+        current_key = self._current_key(call_sid)
+        list_key = self._list_key(call_sid, token)
+        try:
+            await self.redis.set(current_key, token, ex=self._ttl())
+            async for sentence in sentences:
+                current = await self.redis.get(current_key)
+                if current is None or current.decode() != token:
+                    self.logger.debug(f"Reply superseded for call: {call_sid}")
+                    return
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.rpush(list_key, sentence)
+                    pipe.expire(list_key, self._ttl())
+                    await pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Error generating pending reply: {e}")
+        finally:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.rpush(list_key, _END)
+                    pipe.expire(list_key, self._ttl())
+                    await pipe.execute()
+            except Exception as e:
+                self.logger.error(f"Error finishing pending reply: {e}")
+
+    async def take(self, call_sid: str) -> Optional[AsyncIterator[str]]:
+        """
+        取出指定通话的回复
+
+        Args:
+            call_sid (str): 通话 ID
+
+        Returns:
+            Optional[AsyncIterator[str]]: 回复句子的异步迭代器，没有记录时返回None
+        """
+        token = await self.redis.get(self._current_key(call_sid))
+        if token is None:
+            return None
+        return self._iterate(self._list_key(call_sid, token.decode()))
+
+    async def _iterate(self, list_key: str) -> AsyncIterator[str]:
+        while True:
+            item = await self.redis.blpop([list_key], timeout=self.read_timeout)
+            if item is None:
+                self.logger.warning(f"Timed out waiting for pending reply: {list_key}")
+                return
+            sentence = item[1].decode()
+            if sentence == _END:
+                await self.redis.delete(list_key)
+                return
+            yield sentence
+
+    async def stop(self) -> None:
+        """取消本进程内所有进行中的回复"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.local.clear()
@@ -1,52 +1,43 @@
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from collections import OrderedDict, deque
+from typing import Deque, Optional
 import logging
+import time
 
 class RateLimiter:
     """
     速率限制器实现
     用于控制每个用户的通话和短信频率
+    方法为异步，与 RedisRateLimiter 接口一致，进程内实现本身不会阻塞
     """
     
-    def __init__(self, max_requests_per_day: int = 100, cleanup_interval: int = 24):
+    def __init__(
+        self,
+        max_requests_per_day: int = 100,
+        window_seconds: int = 86400,
+        max_tracked: int = 100_000
+    ):
         """
         初始化速率限制器
         
         Args:
             max_requests_per_day (int): 每日最大请求数
-            cleanup_interval (int): 清理历史记录的间隔（小时）
+            window_seconds (int): 滚动窗口长度（秒）
+            max_tracked (int): 最多跟踪的号码数量，超出时淘汰最久未访问的号码
         """
         self.max_requests = max_requests_per_day
-        self.cleanup_interval = cleanup_interval
-        self.requests: Dict[str, List[datetime]] = {}
-        self.last_cleanup: Optional[datetime] = None
+        self.window_seconds = window_seconds
+        self.max_tracked = max_tracked
+        # 每个号码保存窗口内请求的时间戳（秒），按时间先后排列；
+        # 号码按最近访问顺序排列，用于 LRU 淘汰
+        self.requests: "OrderedDict[str, Deque[float]]" = OrderedDict()
         self.logger = logging.getLogger(__name__)
         
-    def _cleanup_old_records(self) -> None:
-        """清理过期的请求记录"""
-        try:
-            now = datetime.now()
-            if (self.last_cleanup and 
-                now - self.last_cleanup < timedelta(hours=self.cleanup_interval)):
-                return
-                
-            yesterday = now - timedelta(days=1)
-            for number in list(self.requests.keys()):
-                # 只保留24小时内的记录
-                self.requests[number] = [
-                    timestamp for timestamp in self.requests[number]
-                    if timestamp > yesterday
-                ]
-                # 如果没有有效记录，删除该号码的记录
-                if not self.requests[number]:
-                    del self.requests[number]
-                    
-            self.last_cleanup = now
-            self.logger.debug(f"Cleaned up rate limiting records. Active numbers: {len(self.requests)}")
-        except Exception as e:
-            self.logger.error(f"Error during cleanup: {e}")
+    def _evict(self, timestamps: Deque[float], cutoff: float) -> None:
+        """从左侧弹出早于 cutoff 的时间戳"""
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
     
-    def can_proceed(self, number: str) -> bool:
+    async def can_proceed(self, number: str) -> bool:
         """
         检查给定号码是否可以继续请求
         
@@ -61,31 +52,28 @@ class RateLimiter:
             return False
             
         try:
-            self._cleanup_old_records()
-            
-            now = datetime.now()
-            today = now.date()
+            # 每次调用只取一次当前时间，窗口边界也只计算一次
+            now = time.time()
             
-            # 如果是新号码，初始化记录
-            if number not in self.requests:
-                self.requests[number] = []
-            
-            # 只统计今天的请求
-            today_requests = [
-                req for req in self.requests[number]
-                if req.date() == today
-            ]
-            
-            # 更新该号码的请求记录
-            self.requests[number] = today_requests
+            timestamps = self.requests.get(number)
+            if timestamps is None:
+                # 新号码没有历史记录，无需清理
+                timestamps = self.requests[number] = deque()
+                # 超出容量时淘汰最久未访问的号码，保证内存有上限
+                if len(self.requests) > self.max_tracked:
+                    self.requests.popitem(last=False)
+            else:
+                self.requests.move_to_end(number)
+                # 只统计窗口内的请求
+                self._evict(timestamps, now - self.window_seconds)
             
             # 检查是否超过限制
-            if len(today_requests) >= self.max_requests:
+            if len(timestamps) >= self.max_requests:
                 self.logger.warning(f"Rate limit exceeded for number: {number}")
                 return False
                 
             # 记录新的请求
-            self.requests[number].append(now)
+            timestamps.append(now)
             return True
             
         except Exception as e:
@@ -93,9 +81,9 @@ class RateLimiter:
             # 发生错误时，为安全起见返回False
             return False
     
-    def get_remaining_requests(self, number: str) -> int:
+    async def get_remaining_requests(self, number: str) -> int:
         """
-        获取指定号码今天剩余的请求次数
+        获取指定号码在当前窗口内剩余的请求次数
         
         Args:
             number (str): 电话号码
@@ -107,20 +95,17 @@ class RateLimiter:
             return 0
             
         try:
-            self._cleanup_old_records()
-            
-            today = datetime.now().date()
-            today_requests = [
-                req for req in self.requests.get(number, [])
-                if req.date() == today
-            ]
+            timestamps = self.requests.get(number)
+            if not timestamps:
+                return self.max_requests
             
-            return max(0, self.max_requests - len(today_requests))
+            self._evict(timestamps, time.time() - self.window_seconds)
+            return max(0, self.max_requests - len(timestamps))
         except Exception as e:
             self.logger.error(f"Error getting remaining requests: {e}")
             return 0
     
-    def reset(self, number: Optional[str] = None) -> None:
+    async def reset(self, number: Optional[str] = None) -> None:
         """
         重置速率限制记录
         
@@ -0,0 +1,135 @@
+import time
+import uuid
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import NoScriptError
+
+from utils.logger import get_logger
+
+# 在一次原子操作内完成：清理窗口外记录、计数、按需记录本次请求
+# KEYS[1]: 号码对应的有序集合
+# ARGV[1]: 当前时间（毫秒）  ARGV[2]: 窗口长度（毫秒）
+# ARGV[3]: 最大请求数        ARGV[4]: 本次请求的唯一成员
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, tonumber(ARGV[1]) - tonumber(ARGV[2]))
+local n = redis.call('ZCARD', KEYS[1])
+if n >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+class RedisRateLimiter:
+    """
+    基于 Redis 的速率限制器
+    多个 worker 之间共享同一份计数，接口与 RateLimiter 一致，但方法为异步
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        max_requests_per_day: int = 100,
+        window_seconds: int = 86400,
+        prefix: str = "rl"
+    ):
+        """
+        初始化速率限制器
+
+        Args:
+            redis (Redis): 共享的 Redis 异步客户端
+            max_requests_per_day (int): 每日最大请求数
+            window_seconds (int): 滚动窗口长度（秒）
+            prefix (str): Redis 键前缀，用于区分通话和短信
+        """
+        self.redis = redis
+        self.max_requests = max_requests_per_day
+        self.window_ms = window_seconds * 1000
+        self.prefix = prefix
+        self.script_sha: Optional[str] = None
+        self.logger = get_logger('redis_rate_limiter')
+
+    def _key(self, number: str) -> str:
+        return f"{self.prefix}:{number}"
+
+    async def load(self) -> None:
+        """启动时预先加载 Lua 脚本，之后通过 EVALSHA 调用"""
+        self.script_sha = await self.redis.script_load(ACQUIRE_SCRIPT)
+
+    async def can_proceed(self, number: str) -> bool:
+        """
+        检查给定号码是否可以继续请求
+
+        Args:
+            number (str): 电话号码
+
+        Returns:
+            bool: 如果可以继续请求返回True，否则返回False
+        """
+        if not number:
+            self.logger.warning("Empty phone number provided")
+            return False
+
+        try:
+            if self.script_sha is None:
+                await self.load()
+
+            now_ms = int(time.time() * 1000)
+            args = [now_ms, self.window_ms, self.max_requests, f"{now_ms}-{uuid.uuid4().hex}"]
+            try:
+                allowed = await self.redis.evalsha(self.script_sha, 1, self._key(number), *args)
+            except NoScriptError:
+                # Redis 重启或执行了 SCRIPT FLUSH，重新加载脚本
+                await self.load()
+                allowed = await self.redis.evalsha(self.script_sha, 1, self._key(number), *args)
+
+            if not allowed:
+                self.logger.warning(f"Rate limit exceeded for number: {number}")
+                return False
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error checking rate limit: {e}")
+            # 发生错误时，为安全起见返回False
+            return False
+
+    async def get_remaining_requests(self, number: str) -> int:
+        """
+        获取指定号码在当前窗口内剩余的请求次数
+
+        Args:
+            number (str): 电话号码
+
+        Returns:
+            int: 剩余的请求次数
+        """
+        if not number:
+            return 0
+
+        try:
+            now_ms = int(time.time() * 1000)
+            used = await self.redis.zcount(self._key(number), now_ms - self.window_ms + 1, "+inf")
+            return max(0, self.max_requests - used)
+        except Exception as e:
+            self.logger.error(f"Error getting remaining requests: {e}")
+            return 0
+
+    async def reset(self, number: Optional[str] = None) -> None:
+        """
+        重置速率限制记录
+
+        Args:
+            number (Optional[str]): 指定号码，如果为None则重置所有记录
+        """
+        try:
+            if number:
+                await self.redis.delete(self._key(number))
+                self.logger.info(f"Reset rate limit for number: {number}")
+            else:
+                async for key in self.redis.scan_iter(match=f"{self.prefix}:*"):
+                    await self.redis.delete(key)
+                self.logger.info("Reset all rate limits")
+        except Exception as e:
+            self.logger.error(f"Error resetting rate limits: {e}")
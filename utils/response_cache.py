@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.logger import get_logger
+
+class ResponseCache:
+    """
+    LLM 回复缓存
+    以规范化后的提示词为键缓存回复，带过期时间；
+    相同提示词的并发请求只会触发一次实际调用
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600, log_every: int = 100):
+        """
+        初始化回复缓存
+
+        Args:
+            maxsize (int): 最多缓存的提示词数量
+            ttl (float): 缓存有效期（秒）
+            log_every (int): 每多少次查询记录一次命中率
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.log_every = log_every
+        self.entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.lookups = 0
+        self.logger = get_logger('response_cache')
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """规范化提示词：去掉首尾空白并转为小写"""
+        return prompt.strip().lower()
+
+    def _record(self, hit: bool) -> None:
+        """统计命中率，定期写入日志便于调整缓存参数"""
+        self.lookups += 1
+        if hit:
+            self.hits += 1
+        if self.lookups % self.log_every == 0:
+            self.logger.info(
+                f"Response cache hit ratio: {self.hits / self.lookups:.1%} "
+                f"({self.hits}/{self.lookups})"
+            )
+
+    def get(self, prompt: str) -> Optional[str]:
+        """
+        读取缓存的回复
+
+        Args:
+            prompt (str): 用户输入
+
+        Returns:
+            Optional[str]: 命中时返回回复，否则返回None
+        """
+        key = self.normalize(prompt)
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self._record(True)
+                return value
+            del self.entries[key]
+
+        self._record(False)
+        return None
+
+    def set(self, prompt: str, value: str) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            prompt (str): 用户输入
+            value (str): LLM 回复
+        """
+        key = self.normalize(prompt)
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def acquire(self, prompt: str) -> Optional[str]:
+        """
+        返回缓存或进行中的相同调用的结果；都没有时登记调用方为生成者
+
+        返回None时调用方成为生成者，之后必须调用 resolve 或 abandon。
+        生成者失败时，等待者会收到同样的异常；生成者被取消时，等待者重新尝试，
+        而不是继承这次取消
+
+        Args:
+            prompt (str): 用户输入
+
+        Returns:
+            Optional[str]: LLM 回复，或None表示需要由调用方生成
+        """
+        key = self.normalize(prompt)
+        while True:
+            cached = self.get(prompt)
+            if cached is not None:
+                return cached
+
+            pending = self.inflight.get(key)
+            if pending is None:
+                self.inflight[key] = asyncio.get_running_loop().create_future()
+                return None
+
+            try:
+                # 已有相同请求在进行中，等待其结果而不是重复调用
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    # 是调用方自己被取消
+                    raise
+
+    def resolve(self, prompt: str, value: str) -> None:
+        """
+        生成者成功后写入缓存，并唤醒所有等待者
+
+        Args:
+            prompt (str): 用户输入
+            value (str): LLM 回复
+        """
+        self.set(prompt, value)
+        future = self.inflight.pop(self.normalize(prompt), None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def abandon(self, prompt: str, error: Optional[BaseException] = None) -> None:
+        """
+        生成者放弃生成：有 error 时等待者收到该异常，否则等待者重新尝试
+
+        Args:
+            prompt (str): 用户输入
+            error (Optional[BaseException]): 生成失败的原因（不会被缓存）
+        """
+        future = self.inflight.pop(self.normalize(prompt), None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            future.exception()
+
+    async def get_or_compute(self, prompt: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        优先返回缓存；未命中时调用 compute，相同提示词的并发请求共享同一次调用
+
+        Args:
+            prompt (str): 用户输入
+            compute (Callable[[], Awaitable[str]]): 生成回复的协程函数，失败时应抛出异常（异常不会被缓存）
+
+        Returns:
+            str: LLM 回复
+        """
+        value = await self.acquire(prompt)
+        if value is not None:
+            return value
+
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            self.abandon(prompt)
+            raise
+        except Exception as e:
+            self.abandon(prompt, e)
+            raise
+
+        self.resolve(prompt, value)
+        return value